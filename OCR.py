@@ -9,13 +9,256 @@ https://github.com/mnicolleUTC/OCR-applied-to-transcript-of-records.git
 
 import os
 import re
+import json
+import subprocess
 import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import pandas as pd
 import pytesseract
 import unidecode
 from fuzzywuzzy import fuzz
 from fuzzywuzzy import process
 from pdf2image import convert_from_path
+from PIL import Image
+
+# Default OCR profile. Other profiles can be produced with autotune.py and
+# saved in the file PROFILES_FILE.
+# Source for oem and psm = https://muthu.co/all-tesseract-ocr-options/
+# oem 1 = Neural nets LSTM engine only.
+# psm 4 = reading document as multiple columns
+DEFAULT_PROFILE = {
+    'dpi': 600,
+    'oem': 1,
+    'psm': 4,
+    'lang': 'fra',
+    'preprocessing': 'none',
+}
+PROFILES_FILE = 'ocr_profiles.json'
+# Configuration used to re-OCR a single line which failed to be parsed.
+# psm 7 = treat the image as a single text line. Whitelist restricts output
+# to the characters which can be found in transcript of records lines.
+REPAIR_CONFIG = r'--oem 1 --psm 7 -c tessedit_char_whitelist=' \
+                r'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz' \
+                r'0123456789éèêëàâçîïôûùÉ-,.()'
+# Configuration used to re-OCR the lines giving the education period and the
+# number of credits. No whitelist because these lines contain apostrophes
+# ("l'UTC", "l'automne") which cannot be safely quoted in a whitelist.
+INTRO_REPAIR_CONFIG = r'--oem 1 --psm 7'
+
+
+def load_profile(profile=None, path_profiles=PROFILES_FILE):
+    """
+    Load an OCR profile defining the resolution, the tesseract options and the
+    preprocessing of pdf pages
+
+    Parameters
+    ----------
+    profile : str or dict, optional
+        Name of a profile saved in path_profiles or profile itself. Missing
+        keys are taken from DEFAULT_PROFILE. The default is None which gives
+        DEFAULT_PROFILE.
+    path_profiles : str, optional
+        Path to the json file containing named profiles.
+        The default is PROFILES_FILE.
+
+    Returns
+    -------
+    dict
+        OCR profile with keys 'dpi', 'oem', 'psm', 'lang' and 'preprocessing'
+    """
+    if profile is None:
+        profile = dict()
+    elif isinstance(profile, str):
+        with open(path_profiles, 'r') as file_profiles:
+            dict_profiles = json.load(file_profiles)
+        if profile not in dict_profiles:
+            raise KeyError(f"OCR profile '{profile}' not found in "
+                           f"{path_profiles}")
+        profile = dict_profiles[profile]
+    return {**DEFAULT_PROFILE, **profile}
+
+
+def preprocess_page(page, preprocessing):
+    """
+    Apply preprocessing to one page image before OCR
+
+    Parameters
+    ----------
+    page : PIL.Image.Image or str
+        Image of one pdf page or path of the image file returned by
+        rasterize_pdf
+    preprocessing : str
+        'none' to keep the image file untouched, 'grayscale' to convert the
+        image into grey levels or 'binarize' to convert the image into black
+        and white pixels
+
+    Returns
+    -------
+    PIL.Image.Image or str
+        Preprocessed image or page untouched for 'none'
+    """
+    if preprocessing == 'none':
+        return page
+    if isinstance(page, str):
+        with Image.open(page) as image:
+            image = image.convert('L')
+    else:
+        image = page.convert('L')
+    if preprocessing == 'binarize':
+        image = image.point(lambda x: 255 if x > 128 else 0)
+    elif preprocessing != 'grayscale':
+        raise ValueError(f"Unknown preprocessing '{preprocessing}'")
+    return image
+
+
+def rasterize_pdf(pdf_path, dpi_val, output_folder):
+    """
+    Convert each pdf page into a PPM image file written directly by the
+    rasterizer of pdf2image (pdftoppm). Giving the path of these files to
+    tesseract avoids pytesseract to re-encode every page into a temporary
+    image file which would then be decoded again by tesseract.
+
+    Parameters
+    ----------
+    pdf_path : str
+        Absolute or relative path to the PDF file
+    dpi_val : int
+        Dots per inch used to convert pdf pages into images
+    output_folder : str
+        Folder in which PPM files are written, usually a temporary directory
+
+    Returns
+    -------
+    list
+        Paths of the PPM file of each page in the order of the pages
+    """
+    return convert_from_path(pdf_path, dpi_val, output_folder=output_folder,
+                             fmt='ppm', paths_only=True)
+
+
+def ocr_page(page, profile=None):
+    """
+    Extract raw text data from one page image with tesseract OCR
+
+    Parameters
+    ----------
+    page : PIL.Image.Image or str
+        Image of one pdf page produced by pdf2image or path of the image file
+        returned by rasterize_pdf
+    profile : dict, optional
+        OCR profile returned by load_profile. The default is None which gives
+        DEFAULT_PROFILE.
+
+    Returns
+    -------
+    txt : str
+        Raw text data extracted with tesseract OCR from the page
+    """
+    profile = load_profile(profile)
+    custom_config = f"--oem {profile['oem']} --psm {profile['psm']}"
+    page = preprocess_page(page, profile['preprocessing'])
+    txt = pytesseract.image_to_string(page, config=custom_config,
+                                      lang=profile['lang'])
+    return txt
+
+
+def ocr_page_lines(page, profile=None):
+    """
+    Extract raw text data from one page image with tesseract OCR while keeping
+    the bounding box of each line. Text and bounding boxes are produced by the
+    same tesseract run, text being exactly the output of ocr_page. Bounding
+    boxes allow to re-OCR only the lines which failed to be parsed.
+
+    Parameters
+    ----------
+    page : PIL.Image.Image or str
+        Image of one pdf page produced by pdf2image or path of the image file
+        returned by rasterize_pdf
+    profile : dict, optional
+        OCR profile returned by load_profile. The default is None which gives
+        DEFAULT_PROFILE.
+
+    Returns
+    -------
+    txt : str
+        Raw text data extracted with tesseract OCR from the page
+    list_lines : list
+        List of (text, box) for each line of the page in reading order. box is
+        (left, top, right, bottom) expressed in pixels of the page image
+    """
+    profile = load_profile(profile)
+    custom_config = f"--oem {profile['oem']} --psm {profile['psm']}"
+    page = preprocess_page(page, profile['preprocessing'])
+    with tempfile.TemporaryDirectory() as ocr_folder:
+        # Image file given as is to tesseract, preprocessed image saved first
+        if isinstance(page, str):
+            input_filename = page
+        else:
+            input_filename = os.path.join(ocr_folder, 'page.png')
+            page.save(input_filename)
+        output_base = os.path.join(ocr_folder, 'page')
+        # Configuration file "txt" writes text data, tessedit_create_tsv
+        # writes words with their bounding boxes in the same run
+        pytesseract.pytesseract.run_tesseract(
+            input_filename, output_base, extension='txt',
+            lang=profile['lang'],
+            config=f"{custom_config} -c tessedit_create_tsv=1")
+        with open(output_base + '.txt', encoding='utf-8') as file_txt:
+            txt = file_txt.read()
+        with open(output_base + '.tsv', encoding='utf-8') as file_tsv:
+            tsv = file_tsv.read()
+    # Grouping words by line. Dictionary keeps tesseract reading order
+    rows = [row.split('\t') for row in tsv.splitlines()]
+    header = rows[0] if rows else []
+    dict_lines = dict()
+    for row in rows[1:]:
+        if len(row) != len(header):
+            continue
+        data = dict(zip(header, row))
+        word = data['text']
+        if not word.strip():
+            continue
+        key = (data['block_num'], data['par_num'], data['line_num'])
+        left, top = int(data['left']), int(data['top'])
+        right, bottom = left + int(data['width']), top + int(data['height'])
+        if key in dict_lines:
+            words, box = dict_lines[key]
+            words.append(word)
+            dict_lines[key] = [words, (min(box[0], left), min(box[1], top),
+                                       max(box[2], right), max(box[3], bottom))]
+        else:
+            dict_lines[key] = [[word], (left, top, right, bottom)]
+    list_lines = [(' '.join(words), box) for words, box in dict_lines.values()]
+    return txt, list_lines
+
+
+def ocr_line(line_image, config=REPAIR_CONFIG, profile=None):
+    """
+    Extract raw text data from the image of a single line with a tight
+    tesseract configuration
+
+    Parameters
+    ----------
+    line_image : PIL.Image.Image or str
+        Image cropped around one line of a pdf page or path of the image file
+        returned by rasterize_crop
+    config : str, optional
+        Tesseract configuration. The default is REPAIR_CONFIG.
+    profile : dict, optional
+        OCR profile returned by load_profile, only its 'lang' key is used.
+        The default is None which gives DEFAULT_PROFILE.
+
+    Returns
+    -------
+    str
+        Raw text data of the line without line break
+    """
+    profile = load_profile(profile)
+    txt = pytesseract.image_to_string(line_image, config=config,
+                                      lang=profile['lang'])
+    return ' '.join(txt.split())
 
 
 def convert_pdf(pdf_path, dpi_val, save_image=False, save_raw_text=False):
@@ -45,17 +288,19 @@ def convert_pdf(pdf_path, dpi_val, save_image=False, save_raw_text=False):
         pdf page
     """
     main_dir = os.getcwd()
-    custom_config = r'--oem 1 --psm 4'
-    # Source for custom_config = https://muthu.co/all-tesseract-ocr-options/
-    # oem 1 = Neural nets LSTM engine only.
-    # psm 4 = reading document as multiple columns
-    pages = convert_from_path(pdf_path, dpi_val)
+    with tempfile.TemporaryDirectory() as raster_folder:
+        pages = rasterize_pdf(pdf_path, dpi_val, raster_folder)
+        # Extract data of every page
+        list_txt = [ocr_page(page) for page in pages]
+        # Decoding images only if they have to be saved
+        if save_image:
+            for j, path_page in enumerate(pages):
+                with Image.open(path_page) as image:
+                    image.load()
+                pages[j] = image
     list_pages = list()
     student_name = ""
-    for i, page in enumerate(pages):
-        # Extract data of page i
-        txt = pytesseract.image_to_string(page, config=custom_config,
-                                          lang='fra')
+    for i, (page, txt) in enumerate(zip(pages, list_txt)):
         # Extract student name in the first page for saving purpose
         if i == 1:
             student_name = identify_student_name(txt)
@@ -74,6 +319,273 @@ def convert_pdf(pdf_path, dpi_val, save_image=False, save_raw_text=False):
     return list_pages
 
 
+def rasterize_crop(pdf_path, index_page, box, dpi_val, repair_dpi,
+                   output_base):
+    """
+    Convert only the region of one line of a pdf page into a PGM image file
+    with pdftoppm. The rest of the page is not rasterized, which keeps the
+    cost of a high resolution repair proportional to the size of the line.
+
+    Parameters
+    ----------
+    pdf_path : str
+        Absolute or relative path to the PDF file
+    index_page : int
+        Index of the page in the pdf file
+    box : tuple
+        Bounding box (left, top, right, bottom) of the line, expressed in
+        pixels of the page converted with dpi_val
+    dpi_val : int
+        Dots per inch used for the first conversion of the page
+    repair_dpi : int
+        Dots per inch used for the conversion of the line
+    output_base : str
+        Path of the output file without extension
+
+    Returns
+    -------
+    str
+        Path of the PGM image file of the line
+    """
+    scale = repair_dpi / dpi_val
+    # Margin in pixels around the line so that no character is cut
+    margin = int(10 * scale)
+    left, top, right, bottom = box
+    x = max(int(left * scale) - margin, 0)
+    y = max(int(top * scale) - margin, 0)
+    width = int((right - left) * scale) + 2 * margin
+    height = int((bottom - top) * scale) + 2 * margin
+    subprocess.run(['pdftoppm', '-f', str(index_page + 1),
+                    '-l', str(index_page + 1), '-r', str(repair_dpi),
+                    '-x', str(x), '-y', str(y), '-W', str(width),
+                    '-H', str(height), '-gray', '-singlefile',
+                    pdf_path, output_base],
+                   check=True, capture_output=True)
+    return output_base + '.pgm'
+
+
+def reocr_lines(pdf_path, index_page, list_boxes, dpi_val,
+                config=REPAIR_CONFIG, repair_dpi=1200, profile=None):
+    """
+    Re-OCR only the given lines of one pdf page. Each line is converted again
+    with a higher resolution and read with a single line configuration.
+
+    Parameters
+    ----------
+    pdf_path : str
+        Absolute or relative path to the PDF file
+    index_page : int
+        Index of the page in the pdf file
+    list_boxes : list
+        Bounding boxes (left, top, right, bottom) of the lines to re-OCR,
+        expressed in pixels of the page converted with dpi_val
+    dpi_val : int
+        Dots per inch used for the first conversion of the page
+    config : str, optional
+        Tesseract configuration. The default is REPAIR_CONFIG.
+    repair_dpi : int, optional
+        Dots per inch used for the conversion of the lines to repair.
+        The default is 1200.
+    profile : dict, optional
+        OCR profile returned by load_profile, only its 'lang' key is used.
+        The default is None which gives DEFAULT_PROFILE.
+
+    Returns
+    -------
+    list_txt : list
+        Raw text data of each line in the order of list_boxes
+    """
+    list_txt = list()
+    with tempfile.TemporaryDirectory() as crop_folder:
+        for j, box in enumerate(list_boxes):
+            path_crop = rasterize_crop(pdf_path, index_page, box, dpi_val,
+                                       repair_dpi,
+                                       os.path.join(crop_folder, f'line{j}'))
+            list_txt.append(ocr_line(path_crop, config, profile))
+    return list_txt
+
+
+def identify_line_box(line, list_lines):
+    """
+    Identify the bounding box of a line of the raw text data among the lines
+    returned by ocr_page_lines. Both come from the same tesseract run so the
+    words are the same, only spaces may differ.
+
+    Parameters
+    ----------
+    line : str
+        Line extracted from raw text data
+    list_lines : list
+        List of (text, box) of the page returned by ocr_page_lines
+
+    Returns
+    -------
+    tuple
+        Bounding box of the line, None if the line is not identified
+    """
+    words = line.split()
+    for text, box in list_lines:
+        if text.split() == words:
+            return box
+    # Fallback with fuzzywuzzy in case of slight differences
+    dict_boxes = {j: text for j, (text, box) in enumerate(list_lines)}
+    match = process.extractOne(' '.join(words), dict_boxes,
+                               scorer=fuzz.ratio)
+    if match and match[1] >= 90:
+        return list_lines[match[2]][1]
+    return None
+
+
+def is_failed_line(line):
+    """
+    Test if a line of the transcript of records spreadsheet failed to be
+    parsed. Only lines looking like a row of the spreadsheet are considered:
+    a subject code has been recognized but no grade, or a grade has been
+    recognized right after the number of credits but no subject code. Other lines (titles, addresses, sentences of first page
+    where "à" is read as grade A...) are not considered failed.
+
+    Parameters
+    ----------
+    line : str
+        Line extracted from raw text data
+
+    Returns
+    -------
+    bool
+        True if the line failed to be parsed
+    """
+    subject_code, grade = extract_line_data(line)
+    if subject_code != "xxxx":
+        return grade == 'Z'
+    if grade == 'Z':
+        return False
+    # Row of the spreadsheet gives the number of credits then the grade
+    row_pattern = r"\s[0-9]{1,2}\s+(FX|Fx|fx|[a-fA-FG])(\s|$)"
+    return re.search(row_pattern, unidecode.unidecode(line)) is not None
+
+
+def repair_lines(pdf_path, index_page, txt, list_lines, list_index, dpi_val,
+                 config=REPAIR_CONFIG, profile=None):
+    """
+    Re-OCR the given lines of the raw text data of one page
+
+    Parameters
+    ----------
+    pdf_path : str
+        Absolute or relative path to the PDF file
+    index_page : int
+        Index of the page in the pdf file
+    txt : str
+        Raw text data of the page returned by ocr_page_lines
+    list_lines : list
+        List of (text, box) of the page returned by ocr_page_lines
+    list_index : list
+        Index of the lines to re-OCR in txt split based on line break
+    dpi_val : int
+        Dots per inch used for the first conversion of the page
+    config : str, optional
+        Tesseract configuration. The default is REPAIR_CONFIG.
+    profile : dict, optional
+        OCR profile returned by load_profile, only its 'lang' key is used.
+        The default is None which gives DEFAULT_PROFILE.
+
+    Returns
+    -------
+    dict
+        Re-OCRed text of each line whose bounding box has been identified,
+        with the index of the line as key
+    """
+    split_text = txt.split('\n')
+    dict_boxes = dict()
+    for j in list_index:
+        box = identify_line_box(split_text[j], list_lines)
+        if box is not None:
+            dict_boxes[j] = box
+    list_txt = reocr_lines(pdf_path, index_page, list(dict_boxes.values()),
+                           dpi_val, config, profile=profile)
+    return dict(zip(dict_boxes.keys(), list_txt))
+
+
+def repair_failed_lines(pdf_path, index_page, txt, list_lines, dpi_val,
+                        profile=None):
+    """
+    Re-OCR the lines of one page which failed to be parsed and patch them in
+    place when the new text is parsed correctly. Other lines are kept as
+    returned by tesseract.
+
+    Parameters
+    ----------
+    pdf_path : str
+        Absolute or relative path to the PDF file
+    index_page : int
+        Index of the page in the pdf file
+    txt : str
+        Raw text data of the page returned by ocr_page_lines
+    list_lines : list
+        List of (text, box) of the page returned by ocr_page_lines
+    dpi_val : int
+        Dots per inch used for the first conversion of the page
+    profile : dict, optional
+        OCR profile returned by load_profile, only its 'lang' key is used.
+        The default is None which gives DEFAULT_PROFILE.
+
+    Returns
+    -------
+    str
+        Raw text data of the page with repaired lines
+    """
+    split_text = txt.split('\n')
+    list_index = [j for j, line in enumerate(split_text)
+                  if is_failed_line(line)]
+    dict_repaired = repair_lines(pdf_path, index_page, txt, list_lines,
+                                 list_index, dpi_val, profile=profile)
+    for j, line in dict_repaired.items():
+        if not is_failed_line(line):
+            split_text[j] = line
+    return '\n'.join(split_text)
+
+
+def repair_student_information(pdf_path, txt, list_lines, dpi_val,
+                               profile=None):
+    """
+    Re-OCR the two lines of first page giving the education period and the
+    number of credits of the student, in case the number of credits could not
+    be identified
+
+    Parameters
+    ----------
+    pdf_path : str
+        Absolute or relative path to the PDF file
+    txt : str
+        Raw text data of the first page
+    list_lines : list
+        List of (text, box) of the first page returned by ocr_page_lines
+    dpi_val : int
+        Dots per inch used for the first conversion of the page
+    profile : dict, optional
+        OCR profile returned by load_profile, only its 'lang' key is used.
+        The default is None which gives DEFAULT_PROFILE.
+
+    Returns
+    -------
+    str
+        Raw text data of the first page with repaired lines if the number of
+        credits is identified after repair, else unchanged raw text data
+    """
+    split_text = txt.split('\n')
+    index_line_intro = identify_intro_line(split_text)
+    list_index = [j for j in [index_line_intro, index_line_intro + 1]
+                  if j < len(split_text) and split_text[j].strip()]
+    dict_repaired = repair_lines(pdf_path, 0, txt, list_lines, list_index,
+                                 dpi_val, INTRO_REPAIR_CONFIG, profile)
+    for j, line in dict_repaired.items():
+        split_text[j] = line
+    repaired_txt = '\n'.join(split_text)
+    if identify_student_information(repaired_txt)[0] != "ERR":
+        return repaired_txt
+    return txt
+
+
 def identify_student_name(raw_text_data):
     """
     Identify student's name from raw text data extracted with tesseract OCR
@@ -282,6 +794,33 @@ def identify_same_semester_type(semester_type_candidate, list_text_extract):
     return education_period
 
 
+def identify_intro_line(split_text):
+    """
+    Identify the line of the first page which introduces the education period
+    and the number of credits of the student. Information continues on the
+    following line.
+
+    Parameters
+    ----------
+    split_text : list
+        Raw text data of first pdf page split based on line break
+
+    Returns
+    -------
+    index_line_intro : int
+        Index of the introduction line in split_text
+    """
+    # Define the pattern on first page which is before education period
+    pattern_education_period = "a obtenu, dans le cadre de son inscription à " \
+                               "l'UTC"
+    # Extract line which is the closest to variable pattern_education_period
+    line_intro = process.extractOne(pattern_education_period, split_text,
+                                    scorer=fuzz.token_sort_ratio)
+    # Fetch the index corresponding to the identified line
+    index_line_intro = split_text.index(line_intro[0])
+    return index_line_intro
+
+
 def identify_student_information(first_page):
     """
     Identify the basic information of the student (credits, period of education
@@ -305,14 +844,7 @@ def identify_student_information(first_page):
     """
     # Split raw text data of first page based on line break
     split_text = first_page.split('\n')
-    # Define the pattern on first page which is before education period
-    pattern_education_period = "a obtenu, dans le cadre de son inscription à " \
-                               "l'UTC"
-    # Extract line which is the closest to variable pattern_education_period
-    line_intro = process.extractOne(pattern_education_period, split_text,
-                                    scorer=fuzz.token_sort_ratio)
-    # Fetch the index corresponding to the identified line
-    index_line_intro = split_text.index(line_intro[0])
+    index_line_intro = identify_intro_line(split_text)
     full_line = split_text[index_line_intro] + ' ' + \
                 split_text[index_line_intro + 1]
     # Split the intro line based on space
@@ -356,7 +888,7 @@ def identify_student_information(first_page):
     except (Exception,):
         credit_number = "ERR"
     # Case student have been expelled
-    if credit_number < 130:
+    if credit_number != "ERR" and credit_number < 130:
         speciality = 'TC'
     # Case student have complete entirely his diploma
     else:
@@ -560,8 +1092,9 @@ def extract_line_data(line):
     subject_pattern = r"[A-Z]{2}[0-9]{2}"
     subject_code = identify_subject_code(subject_pattern, line)
     # Defining which pattern correspond to a grade (letter in lowercase or
-    # uppercase between A and E. G in uppercase consider as "C"
-    grade_pattern = r" [a-eA-EG] "
+    # uppercase between A and F or FX for failed subjects. G in uppercase
+    # consider as "C"
+    grade_pattern = r" (FX|Fx|fx|[a-fA-FG]) "
     # Extract all letters corresponding to grade_pattern
     grade_candidates = re.findall(grade_pattern, line)
     # Testing if at least one element is in grade_candidates
@@ -579,7 +1112,105 @@ def extract_line_data(line):
     return subject_code, grade
 
 
-def extract_data(file_path):
+def parse_page(index_page, page):
+    """
+    Extract key information from the raw text data of one pdf page.
+    First page gives the basic information of the student and second page
+    gives the information on erasmus semester.
+
+    Parameters
+    ----------
+    index_page : int
+        Index of the page in the pdf file
+    page : str
+        Raw text data extracted with tesseract OCR from the page
+
+    Returns
+    -------
+    page_information : tuple
+        Basic information of the student (credits, period of education and
+        speciality) for first page or erasmus information (credits and
+        country) for second page
+    list_line_data : list
+        List of [subject_code, grade] extracted from each line of the page
+    """
+    # For first page identify key information about the student
+    if index_page == 0:
+        page_information = identify_student_information(page)
+    # For second page identify whether a semester was spent abroad
+    else:
+        page_information = identify_erasmus_semester(page)
+    split_text = page.split('\n')
+    # Iterating through spreadsheets lines to extract subject code and
+    # associated grade
+    list_line_data = [list(extract_line_data(line)) for line in split_text]
+    return page_information, list_line_data
+
+
+def ocr_and_parse_page(index_page, page, profile=None):
+    """
+    Extract raw text data of one page with tesseract OCR then extract key
+    information from it. Used as the task of one page so that the parsing of
+    a page does not wait for the OCR of the other pages.
+
+    Parameters
+    ----------
+    index_page : int
+        Index of the page in the pdf file
+    page : PIL.Image.Image or str
+        Image of one pdf page or path of the image file returned by
+        rasterize_pdf
+    profile : dict, optional
+        OCR profile returned by load_profile. The default is None which gives
+        DEFAULT_PROFILE.
+
+    Returns
+    -------
+    tuple
+        (page_information, list_line_data) returned by parse_page
+    """
+    return parse_page(index_page, ocr_page(page, profile))
+
+
+def ocr_repair_and_parse_page(index_page, page, pdf_path, dpi_val,
+                              profile=None):
+    """
+    Same as ocr_and_parse_page with a repair pass re-OCRing only the lines of
+    the page which failed to be parsed
+
+    Parameters
+    ----------
+    index_page : int
+        Index of the page in the pdf file
+    page : PIL.Image.Image or str
+        Image of one pdf page or path of the image file returned by
+        rasterize_pdf
+    pdf_path : str
+        Absolute or relative path to the PDF file
+    dpi_val : int
+        Dots per inch used for the conversion of the page
+    profile : dict, optional
+        OCR profile returned by load_profile. The default is None which gives
+        DEFAULT_PROFILE.
+
+    Returns
+    -------
+    result : tuple
+        (page_information, list_line_data) returned by parse_page
+    """
+    txt, list_lines = ocr_page_lines(page, profile)
+    txt = repair_failed_lines(pdf_path, index_page, txt, list_lines, dpi_val,
+                              profile)
+    result = parse_page(index_page, txt)
+    # Number of credits not identified on first page
+    if index_page == 0 and result[0][0] == "ERR":
+        txt = repair_student_information(pdf_path, txt, list_lines, dpi_val,
+                                         profile)
+        result = parse_page(index_page, txt)
+    return result
+
+
+def extract_data(file_path, parallel=False, repair=False, profile=None):
     """
     Convert the data contained in a transcript of records in pdf-format into
     a pandas dataframe
@@ -588,6 +1219,21 @@ def extract_data(file_path):
     ----------
     file_path : str
         Absolute path of transcript of records in pdf-format
+    parallel : bool, optional
+        Enable OCR and parsing of the pdf pages concurrently. Each page is
+        OCRed then parsed in its own thread, so the parsing of a page starts
+        as soon as its OCR is done. Results are merged in the order of the
+        pages so the dataframe is the same as with sequential processing.
+        The default is False.
+    repair : bool, optional
+        Enable a repair pass which re-OCRs only the lines that failed to be
+        parsed (subject code "xxxx" or grade "Z", number of credits "ERR")
+        with higher resolution and single line configuration. Only the
+        repaired lines are patched, the rest of the raw text data is the same
+        as without repair. The default is False.
+    profile : str or dict, optional
+        Name of an OCR profile saved in PROFILES_FILE or profile itself, see
+        load_profile. The default is None which gives DEFAULT_PROFILE.
 
     Returns
     -------
@@ -599,31 +1245,39 @@ def extract_data(file_path):
     """
     # Reading transcript of record with OCR tool and convert it into
     # raw text data
-    list_pages = convert_pdf(file_path, 600)
-    # Initialize dataframe
-    df = pd.DataFrame(columns=['Subject_code', 'Grade'])
+    profile = load_profile(profile)
+    dpi_val = profile['dpi']
+    with tempfile.TemporaryDirectory() as raster_folder:
+        pages = rasterize_pdf(file_path, dpi_val, raster_folder)
+        # No transcript of records can have 3 pages
+        if len(pages) > 2:
+            print("42 You're a God")
+            sys.exit()
+        # One task per page doing OCR, repair if enabled, then parsing
+        if repair:
+            task = partial(ocr_repair_and_parse_page, pdf_path=file_path,
+                           dpi_val=dpi_val, profile=profile)
+        else:
+            task = partial(ocr_and_parse_page, profile=profile)
+        if parallel and len(pages) > 1:
+            with ThreadPoolExecutor(max_workers=len(pages)) as executor:
+                list_results = list(executor.map(task, range(len(pages)),
+                                                 pages))
+        else:
+            list_results = [task(i, page) for i, page in enumerate(pages)]
     # Initialize variable
     credit_number, period, speciality, erasmus_credits, erasmus_country = \
         [0, "", "", 0, ""]
-    # Iterating through each page contained in pdf file
-    for i, page in enumerate(list_pages):
-        # For first page identify key information about the student
+    # Merging results of each page in the order of the pages
+    list_data = list()
+    for i, (page_information, list_line_data) in enumerate(list_results):
         if i == 0:
-            credit_number, period, speciality = identify_student_information(
-                page)
-        # For second page identify whether a semester was spent abroad
-        elif i == 1:
-            erasmus_credits, erasmus_country = identify_erasmus_semester(page)
-        # No transcript of records can have 3 pages
+            credit_number, period, speciality = page_information
         else:
-            print("42 You're a God")
-            sys.exit()
-        split_text = page.split('\n')
-        # Iterating through spreadsheets lines to extract subject code and
-        # associated grade
-        for line in split_text:
-            subject_code, grade = extract_line_data(line)
-            df.loc[df.shape[0]] = [subject_code, grade]
+            erasmus_credits, erasmus_country = page_information
+        list_data.extend(list_line_data)
+    # Initialize dataframe
+    df = pd.DataFrame(list_data, columns=['Subject_code', 'Grade'])
     # Adding resume information on the student at the end of dataframe
     df.loc[df.shape[0]] = ['PERIOD', f'{period}']
     df.loc[df.shape[0]] = ['TOTAL_CREDITS', f'{credit_number}']
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Search of the fastest OCR profile reaching a target accuracy on a labelled
+corpus of transcript of records. The profile found is saved in the file
+PROFILES_FILE and can be used with extract_data(file_path, profile=name).
+
+@author: Nicolle Mathieu
+"""
+import os
+import json
+import time
+from collections import Counter
+from itertools import product
+import pandas as pd
+from pdf2image import pdfinfo_from_path
+from OCR import extract_data, DEFAULT_PROFILE, PROFILES_FILE
+
+# Grid of OCR options explored by default
+# psm 3 = fully automatic page segmentation
+# psm 6 = assume a single uniform block of text
+# oem 3 = default engine, based on what is available
+DEFAULT_GRID = {
+    'dpi': [300, 400, 600],
+    'oem': [1, 3],
+    'psm': [3, 4, 6],
+    'preprocessing': ['none', 'grayscale', 'binarize'],
+}
+
+
+def list_labelled_corpus(folder_corpus):
+    """
+    List transcript of records of the labelled corpus. Each pdf file is
+    labelled by a csv file with the same name containing the expected output
+    of extract_data (columns Subject_code and Grade). Pdf files with more
+    than 2 pages are skipped because extract_data exits on them.
+
+    Parameters
+    ----------
+    folder_corpus : str
+        Absolute path to the folder containing the labelled corpus
+
+    Returns
+    -------
+    list_corpus : list
+        List of (path_pdf, df_expected, nb_pages) for each labelled pdf file
+    """
+    list_corpus = list()
+    for file in sorted(os.listdir(folder_corpus)):
+        path_csv = os.path.join(folder_corpus, file[:-4] + '.csv')
+        if file[-4:] != '.pdf' or not os.path.isfile(path_csv):
+            continue
+        path_pdf = os.path.join(folder_corpus, file)
+        nb_pages = pdfinfo_from_path(path_pdf)["Pages"]
+        # No transcript of records can have 3 pages
+        if nb_pages > 2:
+            print(f"Skipped {path_pdf} : {nb_pages} pages")
+            continue
+        df_expected = pd.read_csv(path_csv, dtype=str)
+        list_corpus.append((path_pdf, df_expected, nb_pages))
+    return list_corpus
+
+
+def field_scores(df_result, df_expected):
+    """
+    Compare the fields (subject code with associated grade and information on
+    the student) found in the result of extract_data with the expected ones.
+    Accuracy is the number of fields both found and expected divided by the
+    number of fields found or expected, so that missing fields and extra
+    fields are both penalised.
+
+    Parameters
+    ----------
+    df_result : pandas.DataFrame
+        Dataframe returned by extract_data
+    df_expected : pandas.DataFrame
+        Expected dataframe for the same transcript of records
+
+    Returns
+    -------
+    accuracy : float
+        Intersection over union of found and expected fields
+    precision : float
+        Proportion of found fields which are expected
+    recall : float
+        Proportion of expected fields which are found
+    """
+    def count_fields(df):
+        df = df[df["Subject_code"] != "xxxx"]
+        return Counter(zip(df["Subject_code"].astype(str),
+                           df["Grade"].astype(str)))
+    expected = count_fields(df_expected)
+    found = count_fields(df_result)
+    nb_matched = sum((found & expected).values())
+    nb_union = sum((found | expected).values())
+    accuracy = nb_matched / nb_union if nb_union else 1.0
+    precision = nb_matched / sum(found.values()) if found else 1.0
+    recall = nb_matched / sum(expected.values()) if expected else 1.0
+    return accuracy, precision, recall
+
+
+def evaluate_profile(profile, list_corpus):
+    """
+    Run extract_data with an OCR profile on the labelled corpus. Only the
+    calls to extract_data are timed.
+
+    Parameters
+    ----------
+    profile : dict
+        OCR profile, see OCR.load_profile
+    list_corpus : list
+        List of (path_pdf, df_expected, nb_pages) returned by
+        list_labelled_corpus
+
+    Returns
+    -------
+    dict
+        Mean accuracy, precision and recall over the corpus and number of
+        pdf pages processed per second
+    """
+    list_scores = list()
+    nb_pages = 0
+    elapsed = 0.0
+    for path_pdf, df_expected, nb_pages_pdf in list_corpus:
+        nb_pages += nb_pages_pdf
+        start = time.perf_counter()
+        try:
+            df_result = extract_data(path_pdf, profile=profile)
+        # Profile too poor for the transcript of records to be parsed. Errors
+        # of tesseract itself (TesseractError, TesseractNotFoundError) are
+        # not caught: a broken environment must stop the search
+        except (IndexError, ValueError):
+            df_result = None
+        elapsed += time.perf_counter() - start
+        if df_result is None:
+            list_scores.append((0.0, 0.0, 0.0))
+        else:
+            list_scores.append(field_scores(df_result, df_expected))
+    nb_files = len(list_scores)
+    return {
+        'accuracy': sum(score[0] for score in list_scores) / nb_files,
+        'precision': sum(score[1] for score in list_scores) / nb_files,
+        'recall': sum(score[2] for score in list_scores) / nb_files,
+        'pages_per_sec': nb_pages / elapsed,
+    }
+
+
+def save_profile(name, profile, path_profiles=PROFILES_FILE):
+    """
+    Save a named OCR profile in the json file of profiles
+
+    Parameters
+    ----------
+    name : str
+        Name of the profile
+    profile : dict
+        OCR profile
+    path_profiles : str, optional
+        Path to the json file containing named profiles.
+        The default is PROFILES_FILE.
+    """
+    dict_profiles = dict()
+    if os.path.isfile(path_profiles):
+        with open(path_profiles, 'r') as file_profiles:
+            dict_profiles = json.load(file_profiles)
+    dict_profiles[name] = profile
+    with open(path_profiles, 'w') as file_profiles:
+        json.dump(dict_profiles, file_profiles, indent=4)
+
+
+def autotune(folder_corpus, target_accuracy=0.95, grid=None,
+             name='autotuned', path_profiles=PROFILES_FILE):
+    """
+    Evaluate every combination of OCR options of grid on the labelled corpus
+    and save as profile the fastest one reaching target_accuracy. Results of
+    every combination are saved in the file autotune_result.csv.
+
+    Parameters
+    ----------
+    folder_corpus : str
+        Absolute path to the folder containing the labelled corpus
+    target_accuracy : float, optional
+        Minimum field accuracy required, see field_scores.
+        The default is 0.95.
+    grid : dict, optional
+        Values explored for each key of the profile. Keys not given keep the
+        value of DEFAULT_PROFILE. The default is None which gives
+        DEFAULT_GRID.
+    name : str, optional
+        Name of the saved profile. The default is 'autotuned'.
+    path_profiles : str, optional
+        Path to the json file containing named profiles.
+        The default is PROFILES_FILE.
+
+    Returns
+    -------
+    best_profile : dict
+        Fastest profile reaching target_accuracy, None if no profile reaches
+        it
+    """
+    if grid is None:
+        grid = DEFAULT_GRID
+    list_corpus = list_labelled_corpus(folder_corpus)
+    if not list_corpus:
+        raise FileNotFoundError(f"No labelled pdf file in {folder_corpus}")
+    list_results = list()
+    keys = list(grid.keys())
+    for values in product(*[grid[key] for key in keys]):
+        profile = {**DEFAULT_PROFILE, **dict(zip(keys, values))}
+        scores = evaluate_profile(profile, list_corpus)
+        print(f"{profile} : accuracy {scores['accuracy']:.3f}, "
+              f"precision {scores['precision']:.3f}, "
+              f"recall {scores['recall']:.3f}, "
+              f"{scores['pages_per_sec']:.3f} pages/sec")
+        list_results.append({**profile, **scores})
+    df_results = pd.DataFrame(list_results)
+    df_results.to_csv("autotune_result.csv", index=False)
+    # Selection of the fastest profile reaching target accuracy
+    df_valid = df_results[df_results["accuracy"] >= target_accuracy]
+    if df_valid.empty:
+        print(f"No profile reaches accuracy {target_accuracy}")
+        return None
+    best = df_valid.sort_values(by="pages_per_sec", ascending=False).iloc[0]
+    best_profile = {key: best[key].item() if hasattr(best[key], 'item')
+                    else best[key] for key in DEFAULT_PROFILE}
+    save_profile(name, best_profile, path_profiles)
+    return best_profile
+
+
+if __name__ == '__main__':
+    # Defining folder containing labelled transcript of records
+    folder_labelled = os.path.join(os.getcwd(), "Labelled_corpus")
+    autotune(folder_labelled)
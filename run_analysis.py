@@ -6,20 +6,310 @@ Created on Mon Sep 12 19:19:23 2022
 @author: Nicolle Mathieu
 """
 import os
+import sys
+import hashlib
+import sqlite3
+from collections import Counter
 import pandas as pd
+from pdf2image import convert_from_path
 from OCR import extract_data
 
+# Lines added by extract_data at the end of each student's data
+RESUME_CODES = ['PERIOD', 'TOTAL_CREDITS', 'SPECIALITY', 'ERASMUS_CREDITS',
+                'ERASMUS_COUNTRY']
 
-def concatenate_transcript_of_records(folder_pdf_file):
+
+def content_hash(path_file):
+    """
+    Compute the SHA-256 hash of the content of a file. Two copies of the same
+    transcript of records have the same hash whatever their name or folder.
+
+    Parameters
+    ----------
+    path_file : str
+        Absolute path to the file
+
+    Returns
+    -------
+    str
+        Hexadecimal digest of the file content
+    """
+    sha = hashlib.sha256()
+    with open(path_file, 'rb') as file_pdf:
+        for block in iter(lambda: file_pdf.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def perceptual_hash(path_file, dpi_val=100, hash_size=64):
+    """
+    Compute an average hash of every page of a pdf file. Each page is
+    converted with dpi_val, reduced to hash_size x hash_size pixels in grey
+    levels and each pixel gives one bit depending on whether it is brighter
+    than the mean. With the default values one pixel of the reduced page
+    covers about one line of the spreadsheet, so the hash depends on the
+    table content and not only on the layout shared by all transcripts.
+
+    Parameters
+    ----------
+    path_file : str
+        Absolute path to the pdf file
+    dpi_val : int, optional
+        Dots per inch used to convert pdf pages. The default is 100.
+    hash_size : int, optional
+        Side of the reduced page. The default is 64.
+
+    Returns
+    -------
+    list
+        Perceptual hash of each page on hash_size ** 2 bits
+    """
+    list_hash = list()
+    for page in convert_from_path(path_file, dpi_val):
+        pixels = list(page.convert('L').resize((hash_size,
+                                                hash_size)).getdata())
+        mean = sum(pixels) / len(pixels)
+        page_hash = 0
+        for pixel in pixels:
+            page_hash = (page_hash << 1) | (pixel > mean)
+        list_hash.append(page_hash)
+    return list_hash
+
+
+def hash_distance(list_hash_1, list_hash_2, hash_size=64):
+    """
+    Proportion of different bits between the perceptual hashes of two pdf
+    files. Files with different number of pages are at distance 1.
+
+    Parameters
+    ----------
+    list_hash_1 : list
+        Perceptual hash of each page of the first file
+    list_hash_2 : list
+        Perceptual hash of each page of the second file
+    hash_size : int, optional
+        Side of the reduced page used in perceptual_hash. The default is 64.
+
+    Returns
+    -------
+    float
+        Distance between 0 and 1
+    """
+    if len(list_hash_1) != len(list_hash_2) or not list_hash_1:
+        return 1.0
+    nb_bits = sum(bin(hash_1 ^ hash_2).count('1')
+                  for hash_1, hash_2 in zip(list_hash_1, list_hash_2))
+    return nb_bits / (len(list_hash_1) * hash_size ** 2)
+
+
+def parsed_rows(df_student):
+    """
+    Count the rows of the data extracted from a transcript of records, lines
+    without subject code excluded
+
+    Parameters
+    ----------
+    df_student : pandas.DataFrame
+        Dataframe returned by extract_data
+
+    Returns
+    -------
+    collections.Counter
+        Number of occurrences of each (subject_code, grade)
+    """
+    df_student = df_student[df_student["Subject_code"] != "xxxx"]
+    return Counter(zip(df_student["Subject_code"], df_student["Grade"]))
+
+
+def row_similarity(rows_1, rows_2):
+    """
+    Similarity between the rows of two transcripts of records, computed as
+    the size of their intersection divided by the size of their union
+
+    Parameters
+    ----------
+    rows_1 : collections.Counter
+        Rows of the first transcript returned by parsed_rows
+    rows_2 : collections.Counter
+        Rows of the second transcript returned by parsed_rows
+
+    Returns
+    -------
+    float
+        Similarity between 0 and 1
+    """
+    union = sum((rows_1 | rows_2).values())
+    if not union:
+        return 0.0
+    return sum((rows_1 & rows_2).values()) / union
+
+
+def new_seen_files(seen_files=None):
+    """
+    Initialize or complete the dictionary keeping the files already processed
+
+    Parameters
+    ----------
+    seen_files : dict, optional
+        Dictionary to complete. The default is None.
+
+    Returns
+    -------
+    seen_files : dict
+        Dictionary with key "content" linking each content hash to the path
+        of the file, key "perceptual" linking the path of each file to its
+        perceptual hash and key "rows" linking the path of each file to its
+        rows returned by parsed_rows
+    """
+    if seen_files is None:
+        seen_files = dict()
+    for key in ["content", "perceptual", "rows"]:
+        seen_files.setdefault(key, dict())
+    return seen_files
+
+
+def find_duplicate(path_file, seen_files, use_perceptual_hash=False,
+                   max_distance=0.05, skip_distance=0.01):
+    """
+    Find whether a pdf file is a duplicate of a transcript of records already
+    seen. seen_files is updated with the hashes of path_file if it is not a
+    duplicate.
+    A file with the same content is a duplicate. With perceptual hash, a file
+    whose hash is at most at skip_distance of a file already seen is a
+    re-scan and is skipped without OCR. A file at most at max_distance is
+    only a suspected duplicate: different students share the same layout, so
+    it has to be OCRed and the match confirmed on the parsed rows. Suspected
+    duplicates save no compute, their confirmation only keeps statistics
+    clean.
+
+    Parameters
+    ----------
+    path_file : str
+        Absolute path to the pdf file
+    seen_files : dict
+        Dictionary returned by new_seen_files
+    use_perceptual_hash : bool, optional
+        Enable detection of re-scans with perceptual hash of every page.
+        The default is False.
+    max_distance : float, optional
+        Maximum proportion of different bits between two perceptual hashes,
+        see hash_distance, for a file to be a suspected duplicate.
+        The default is 0.05.
+    skip_distance : float, optional
+        Maximum proportion of different bits between two perceptual hashes
+        for a file to be skipped as a re-scan without OCR. It must be lower
+        than the smallest distance observed between transcripts of different
+        students. The default is 0.01.
+        Both thresholds have not been calibrated on real re-scans: they
+        should be set from the distances observed between re-scans of the
+        same transcript and between transcripts of different students.
+
+    Returns
+    -------
+    file_hash : str
+        Content hash of path_file
+    original : str
+        Path of the file path_file is a duplicate of, None if there is not
+    kind : str
+        'content' for a file with the same content, 'rescan' for a file
+        skipped with perceptual hash, 'suspected' for a suspected duplicate,
+        None if path_file is not a duplicate
+    """
+    file_hash = content_hash(path_file)
+    if file_hash in seen_files["content"]:
+        return file_hash, seen_files["content"][file_hash], 'content'
+    original, kind = None, None
+    if use_perceptual_hash:
+        list_hash = perceptual_hash(path_file)
+        list_distance = [(hash_distance(list_hash, seen_hash), seen_path)
+                         for seen_path, seen_hash
+                         in seen_files["perceptual"].items()]
+        if list_distance:
+            distance, closest = min(list_distance)
+            if distance <= skip_distance:
+                original, kind = closest, 'rescan'
+            elif distance <= max_distance:
+                original, kind = closest, 'suspected'
+        seen_files["perceptual"][path_file] = list_hash
+    seen_files["content"][file_hash] = path_file
+    return file_hash, original, kind
+
+
+def seed_seen_files(seen_files, path_database):
+    """
+    Add to seen_files the content hashes of the transcript of records already
+    stored in the SQLite database, so that duplicates are detected across
+    runs
+
+    Parameters
+    ----------
+    seen_files : dict
+        Dictionary returned by new_seen_files
+    path_database : str
+        Path to the SQLite database file
+
+    Returns
+    -------
+    seen_files : dict
+        Dictionary completed with the content hashes of the database
+    """
+    connection = create_database(path_database)
+    try:
+        rows = connection.execute(
+            "SELECT file_hash, student FROM student_summary").fetchall()
+    finally:
+        connection.close()
+    for file_hash, student in rows:
+        seen_files["content"].setdefault(file_hash, f"database:{student}")
+    return seen_files
+
+
+def concatenate_transcript_of_records(folder_pdf_file,
+                                      use_perceptual_hash=False,
+                                      seen_files=None, path_database=None,
+                                      recursive=False,
+                                      min_row_similarity=0.9, profile=None):
     """
     Concatenate all transcript of records in pdf format into a dataframe
     containing information for every student.
+    Transcript of records with the same content as a file already processed,
+    in this batch, in seen_files or in the database, are skipped before OCR.
+    If use_perceptual_hash is enabled, re-scans of a file already processed
+    are detected with perceptual hash, see find_duplicate: near identical
+    ones are skipped before OCR, suspected ones are OCRed anyway and skipped
+    only if their rows are similar enough to the rows of the original file.
+    Duplicates and suspected duplicates are reported in the file
+    duplicate_result.csv.
 
     Parameters
     ----------
     folder_pdf_file : str
         Absolute path to the folder containing all transcript of record in
         pdf-format
+    use_perceptual_hash : bool, optional
+        Enable detection of re-scans with perceptual hash.
+        The default is False.
+    seen_files : dict, optional
+        Dictionary returned by new_seen_files keeping the files already
+        processed, in order to detect duplicates across several batches. It
+        is updated with the files of this batch. Missing keys are added.
+        The default is None.
+    path_database : str, optional
+        Path to the SQLite database in which the batch is appended with
+        append_to_database. Files already stored in it are duplicates.
+        The default is None (no database).
+    recursive : bool, optional
+        Explore also the sub folders of folder_pdf_file. Student's name is
+        then the path of the file relative to folder_pdf_file so that files
+        with the same name in different sub folders are different students.
+        The default is False.
+    min_row_similarity : float, optional
+        Minimum row_similarity between a suspected duplicate and its original
+        for the suspected duplicate to be skipped. The default is 0.9.
+    profile : str or dict, optional
+        OCR profile given to extract_data, for instance the name of a profile
+        saved by autotune.py. The default is None which gives
+        DEFAULT_PROFILE.
 
     Returns
     -------
@@ -28,21 +318,65 @@ def concatenate_transcript_of_records(folder_pdf_file):
         every student.
     """
     # Initialize dataframe
-    df_columns = ['Subject_code', 'Grade' 'Student']
+    df_columns = ['Subject_code', 'Grade', 'Student', 'File_hash']
     df_all = pd.DataFrame(columns=df_columns)
-    # Loop over pdf file contained in folder_pdf_file
-    for file in os.listdir(folder_pdf_file):
-        if file[-4:] == '.pdf':
-            path_file = os.path.join(folder_pdf_file, file)
-            df_student = extract_data(path_file)
-            # Adding column with student name for each intermediate dataframe
-            # student_name. Student's name is contained in pdf file name
-            df_student["Student"] = file[:-4]
-            # Concatenate df_student to a df_all which contains all the data
-            df_all = pd.concat([df_all, df_student])
+    seen_files = new_seen_files(seen_files)
+    if path_database is not None:
+        seed_seen_files(seen_files, path_database)
+    list_duplicates = list()
+    # List pdf file contained in folder_pdf_file and its sub folders if
+    # recursive is enabled
+    if recursive:
+        list_files = sorted(os.path.join(root, file)
+                            for root, dirs, files in os.walk(folder_pdf_file)
+                            for file in files)
+    else:
+        list_files = [os.path.join(folder_pdf_file, file)
+                      for file in os.listdir(folder_pdf_file)]
+    for path_file in list_files:
+        if path_file[-4:] != '.pdf':
+            continue
+        # Skipping OCR of transcript of records already processed
+        file_hash, original, kind = find_duplicate(path_file, seen_files,
+                                                   use_perceptual_hash)
+        if kind in ['content', 'rescan']:
+            print(f"Duplicate skipped : {path_file} (same as {original})")
+            list_duplicates.append([path_file, original, kind, None])
+            continue
+        df_student = extract_data(path_file, profile=profile)
+        rows = parsed_rows(df_student)
+        seen_files["rows"][path_file] = rows
+        # Confirming suspected duplicate on parsed rows
+        if kind == 'suspected':
+            similarity = row_similarity(rows, seen_files["rows"].get(
+                original, Counter()))
+            if similarity >= min_row_similarity:
+                print(f"Re-scan skipped : {path_file} (same as {original})")
+                list_duplicates.append([path_file, original, 'confirmed',
+                                        similarity])
+                continue
+            print(f"Suspected duplicate kept : {path_file} "
+                  f"(close to {original})")
+            list_duplicates.append([path_file, original, 'suspected',
+                                    similarity])
+        # Adding column with student name for each intermediate dataframe
+        # student_name. Student's name is contained in pdf file name
+        df_student["Student"] = os.path.relpath(path_file,
+                                                folder_pdf_file)[:-4]
+        # Content hash identifies the transcript of records in the database
+        df_student["File_hash"] = file_hash
+        # Concatenate df_student to a df_all which contains all the data
+        df_all = pd.concat([df_all, df_student])
+    # Saving report of duplicated files
+    df_duplicates = pd.DataFrame(list_duplicates,
+                                 columns=['Duplicate', 'Original', 'Type',
+                                          'Similarity'])
+    df_duplicates.to_csv("duplicate_result.csv", index=False)
     # Saving df_all to csv file. This step is not mandatory but for this project
     # it allows us to anonymize the data for further analysis
     df_all.to_csv("database_result.csv", index=False)
+    if path_database is not None:
+        append_to_database(df_all, path_database)
     return df_all
 
 def basics_analysis(path_csv_file):
@@ -143,10 +477,199 @@ def analyse_semester(semester_acronym):
         number_of_semester = number_of_years * 2 + 1
     return number_of_semester
 
+
+def create_database(path_database):
+    """
+    Create if needed the SQLite database storing the data extracted from
+    transcript of records. Each transcript of records is identified by the
+    content hash of its pdf file, student's name being only a label which
+    can be shared by different files. Table grades contains one line per
+    subject code and is indexed on file hash, student, subject code and
+    grade. Table student_summary contains the precomputed information of
+    each transcript of records.
+
+    Parameters
+    ----------
+    path_database : str
+        Path to the SQLite database file
+
+    Returns
+    -------
+    connection : sqlite3.Connection
+        Connection to the database
+    """
+    connection = sqlite3.connect(path_database)
+    connection.executescript('''
+        CREATE TABLE IF NOT EXISTS grades (
+            file_hash TEXT NOT NULL,
+            student TEXT NOT NULL,
+            subject_code TEXT NOT NULL,
+            grade TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_grades_file ON grades (file_hash);
+        CREATE INDEX IF NOT EXISTS idx_grades_student ON grades (student);
+        CREATE INDEX IF NOT EXISTS idx_grades_subject ON grades (subject_code);
+        CREATE INDEX IF NOT EXISTS idx_grades_grade ON grades (grade);
+        CREATE TABLE IF NOT EXISTS student_summary (
+            file_hash TEXT PRIMARY KEY,
+            student TEXT NOT NULL,
+            gpa REAL,
+            nb_subjects INTEGER,
+            total_credits INTEGER,
+            period TEXT,
+            nb_semester INTEGER,
+            speciality TEXT,
+            erasmus_credits INTEGER,
+            erasmus_country TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_summary_student
+            ON student_summary (student);
+        CREATE INDEX IF NOT EXISTS idx_summary_speciality
+            ON student_summary (speciality);
+    ''')
+    return connection
+
+
+def summarize_student(df_student):
+    """
+    Compute the summary of one student from the data extracted from his
+    transcript of records. GPA gives 5 points for grade A down to 0 for grade
+    F, grade FX counts for 0 point as in basics_analysis. Grades not
+    recognized by OCR ('Z') are excluded from GPA and number of subjects.
+
+    Parameters
+    ----------
+    df_student : pandas.DataFrame
+        Dataframe returned by extract_data for one student
+
+    Returns
+    -------
+    list
+        [gpa, nb_subjects, total_credits, period, nb_semester, speciality,
+        erasmus_credits, erasmus_country]
+    """
+    dict_resume = dict(zip(df_student["Subject_code"], df_student["Grade"]))
+    df_subject = df_student[df_student["Subject_code"] != "xxxx"]
+    df_subject = df_subject[~df_subject["Subject_code"].isin(RESUME_CODES)]
+    df_subject = df_subject[df_subject["Grade"] != 'Z']
+    dict_point = {lettre: pt for pt, lettre
+                  in enumerate(["F", "E", "D", "C", "B", "A"])}
+    points = df_subject["Grade"].map(dict_point).fillna(0)
+    nb_subjects = len(df_subject)
+    gpa = round(points.sum() / nb_subjects, 2) if nb_subjects else None
+    period = dict_resume.get("PERIOD")
+    try:
+        nb_semester = analyse_semester(period)
+    except (Exception,):
+        nb_semester = None
+    try:
+        total_credits = int(dict_resume.get("TOTAL_CREDITS"))
+    except (Exception,):
+        total_credits = None
+    try:
+        erasmus_credits = int(dict_resume.get("ERASMUS_CREDITS"))
+    except (Exception,):
+        erasmus_credits = None
+    return [gpa, nb_subjects, total_credits, period, nb_semester,
+            dict_resume.get("SPECIALITY"), erasmus_credits,
+            dict_resume.get("ERASMUS_COUNTRY")]
+
+
+def append_to_database(df_all, path_database):
+    """
+    Append a batch of students to the SQLite database and update their
+    summary. Transcript of records are identified by the content hash of
+    their pdf file: a file already in the database is replaced so that the
+    database stays current when it is processed again, while two students
+    with the same name are kept apart.
+
+    Parameters
+    ----------
+    df_all : pandas.DataFrame
+        Dataframe returned by concatenate_transcript_of_records, with columns
+        Student and File_hash
+    path_database : str
+        Path to the SQLite database file
+    """
+    connection = create_database(path_database)
+    # Nothing to append when every file of the batch was a duplicate
+    if df_all.empty:
+        connection.close()
+        return
+    with connection:
+        for file_hash, df_student in df_all.groupby("File_hash"):
+            student = df_student["Student"].iloc[0]
+            connection.execute("DELETE FROM grades WHERE file_hash = ?",
+                               (file_hash,))
+            # Lines without subject code are not part of the spreadsheet
+            df_subject = df_student[df_student["Subject_code"] != "xxxx"]
+            df_subject = df_subject[
+                ~df_subject["Subject_code"].isin(RESUME_CODES)]
+            connection.executemany(
+                "INSERT INTO grades VALUES (?, ?, ?, ?)",
+                [(file_hash, student, code, grade) for code, grade
+                 in zip(df_subject["Subject_code"], df_subject["Grade"])])
+            connection.execute(
+                "INSERT OR REPLACE INTO student_summary "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [file_hash, student] + summarize_student(df_student))
+    connection.close()
+
+
+def query_database(path_database, query, params=()):
+    """
+    Run an ad-hoc SQL query on the SQLite database
+
+    Parameters
+    ----------
+    path_database : str
+        Path to the SQLite database file
+    query : str
+        SQL query on tables grades and student_summary
+    params : tuple, optional
+        Parameters of the query. The default is ().
+
+    Returns
+    -------
+    pandas.DataFrame
+        Result of the query
+    """
+    connection = sqlite3.connect(path_database)
+    try:
+        df = pd.read_sql_query(query, connection, params=params)
+    finally:
+        connection.close()
+    return df
+
+
+def top_failed_subjects(path_database, top=5):
+    """
+    Subject codes with the highest number of failed grades (F or FX)
+
+    Parameters
+    ----------
+    path_database : str
+        Path to the SQLite database file
+    top : int, optional
+        Number of subject codes returned. The default is 5.
+
+    Returns
+    -------
+    pandas.DataFrame
+        Subject codes and their number of failed grades
+    """
+    query = "SELECT subject_code, COUNT(*) AS nb_failed FROM grades " \
+            "WHERE grade IN ('F', 'FX') GROUP BY subject_code " \
+            "ORDER BY nb_failed DESC LIMIT ?"
+    return query_database(path_database, query, (top,))
+
 if __name__ == '__main__':
     # Defining folder containing transcript of records
     folder_pdf = os.path.join(os.getcwd(), "Transcript_of_records")
+    # Optional name of the OCR profile, for instance saved by autotune.py
+    ocr_profile = sys.argv[1] if len(sys.argv) > 1 else None
     # Concatenate in one dataframe all data extracted from transcript of records
-    df_all_students = concatenate_transcript_of_records(folder_pdf)
+    df_all_students = concatenate_transcript_of_records(folder_pdf,
+                                                        profile=ocr_profile)
     # Run basics analysis on the dataframe
     basics_analysis(os.path.join(os.getcwd(), "Student_data_anonymized"))
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Smoke test of the OCR functions on a small generated pdf file. Skipped when
+tesseract with french language data or pdftoppm is not installed.
+"""
+import os
+import shutil
+import sys
+import pytest
+
+pytesseract = pytest.importorskip("pytesseract")
+pytest.importorskip("pdf2image")
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import OCR
+
+
+def tesseract_available():
+    if shutil.which("tesseract") is None or shutil.which("pdftoppm") is None:
+        return False
+    return 'fra' in pytesseract.get_languages()
+
+
+pytestmark = pytest.mark.skipif(not tesseract_available(),
+                                reason="tesseract (fra) or pdftoppm missing")
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    page = Image.new('RGB', (1700, 2200), 'white')
+    draw = ImageDraw.Draw(page)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", 40)
+    except OSError:
+        font = ImageFont.load_default(size=40)
+    for i, line in enumerate(["MT90 Analyse 6 A", "LO21 Algorithmique 6 B",
+                              "NF16 Structures de donnees 6 FX"]):
+        draw.text((150, 300 + 100 * i), line, fill='black', font=font)
+    path = str(tmp_path / "transcript.pdf")
+    page.save(path, resolution=200)
+    return path
+
+
+def test_ocr_page_lines(pdf_path, tmp_path):
+    pages = OCR.rasterize_pdf(pdf_path, 200, str(tmp_path))
+    txt, list_lines = OCR.ocr_page_lines(pages[0])
+    assert "MT90" in txt
+    assert list_lines
+    text, box = list_lines[0]
+    assert "MT90" in text
+    assert box[0] < box[2] and box[1] < box[3]
+    list_txt = OCR.reocr_lines(pdf_path, 0, [box], 200, repair_dpi=400)
+    assert "MT90" in list_txt[0]